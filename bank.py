@@ -1,35 +1,646 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import sqlite3
-import matplotlib.pyplot as plt
-import seaborn as sns
+import threading
+import time
+from contextlib import contextmanager
 import plotly.express as px
 
 # ------------------------------
 # Database Connection
 # ------------------------------
 DB_PATH = "customer_data"
+READ_ONLY_URI = f"file:{DB_PATH}?mode=ro"
+
+# page_size only takes effect on a fresh database (or after VACUUM) and
+# must be set before switching to WAL, so it goes first.
+PRAGMAS = [
+    "page_size=8192",
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",
+    "cache_size=-65536",
+]
+
+# The read-only connection can't change the journal mode or page size;
+# it only needs the per-connection read settings.
+READER_PRAGMAS = [
+    "query_only=1",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",
+    "cache_size=-65536",
+]
+
+# Covering indexes for the filters, joins and GROUP BYs used by the
+# insight queries. The notebook loader writes support tickets as
+# "tickets", so both names are listed; missing tables are skipped.
+INDEXES = [
+    ("idx_accounts_customer_balance", "accounts(customer_id, account_balance)"),
+    ("idx_txn_customer_status_code_time", "transactions(customer_id, status_code, txn_time)"),
+    ("idx_txn_type_amount", "transactions(txn_type, amount)"),
+    ("idx_txn_status_amount", "transactions(status, amount)"),
+    ("idx_txn_status_code_amount", "transactions(status_code, amount)"),
+    ("idx_loans_customer_status_amount", "loans(Customer_ID, Loan_Status, Loan_Amount)"),
+    ("idx_customers_city", "customers(city)"),
+    ("idx_customers_join_date", "customers(join_date)"),
+    ("idx_customers_name_nocase", "customers(name COLLATE NOCASE)"),
+    ("idx_txn_dow", "transactions(txn_dow)"),
+    ("idx_support_tickets_priority_status", "support_tickets(priority, status, Customer_Rating)"),
+    ("idx_tickets_priority_status", "tickets(priority, status, Customer_Rating)"),
+]
+
+# Generated columns that let WHERE clauses avoid wrapping a column in a
+# function or comparing text. Only VIRTUAL columns can be added to an
+# existing table. status_code: 0 = failed, 1 = success, 2 = other.
+# They show up in SELECT *, so previews of these tables list their real
+# columns explicitly.
+GENERATED_COLUMNS = [
+    ("transactions", "txn_dow", "INTEGER GENERATED ALWAYS AS (CAST(strftime('%w', txn_time) AS INTEGER)) VIRTUAL"),
+    ("transactions", "status_code", "INTEGER GENERATED ALWAYS AS (CASE status WHEN 'failed' THEN 0 WHEN 'success' THEN 1 ELSE 2 END) VIRTUAL"),
+]
+
+# The ensure_* helpers only read the schema unless something is missing,
+# so they are cheap enough to run on every rerun. That matters because
+# the notebook reloads tables with to_sql(if_exists="replace"), which
+# drops the generated columns and indexes. Return whether they changed
+# anything.
+def ensure_generated_columns(conn):
+    missing = []
+    for table, column, definition in GENERATED_COLUMNS:
+        columns = {r[1] for r in conn.execute(f"PRAGMA table_xinfo({table})")}
+        if columns and column not in columns:
+            missing.append(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    if missing:
+        with transaction(conn):
+            for statement in missing:
+                conn.execute(statement)
+    return bool(missing)
+
+def ensure_indexes(conn):
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    missing = [(name, target) for name, target in INDEXES
+               if name not in indexes and target.split("(")[0] in tables]
+    if missing:
+        with transaction(conn):
+            for name, target in missing:
+                conn.execute(f"CREATE INDEX {name} ON {target}")
+            # Refresh sqlite_stat1 so the planner knows about the new indexes.
+            conn.execute("ANALYZE")
+    return bool(missing)
+
+# Rollup tables for the branch queries, so the dashboard doesn't re-join
+# transactions -> customers -> branches on every click. They are rebuilt
+# with every customer write, once older than MV_MAX_AGE, or from the
+# CRUD page. All three join customers, so each CRUD write rebuilds all
+# of them; that is a full join per write, which is cheap at this data
+# size.
+MATERIALIZED_VIEWS = {
+    "mv_branch_daily_txn": """SELECT b.Branch_Name,
+                                     date(t.txn_time) AS txn_date,
+                                     SUM(t.amount) AS total
+                              FROM transactions t
+                              JOIN customers c ON t.customer_id = c.customer_id
+                              JOIN branches b ON c.city = b.City
+                              GROUP BY b.Branch_Name, txn_date""",
+    "mv_branch_balances": """SELECT b.Branch_Name,
+                                    SUM(a.account_balance) AS total_balance
+                             FROM accounts a
+                             JOIN customers c ON a.customer_id = c.customer_id
+                             JOIN branches b ON c.city = b.City
+                             GROUP BY b.Branch_Name""",
+    "mv_branch_performance": """SELECT b.Branch_Name,
+                                       COUNT(DISTINCT c.customer_id) AS total_customers,
+                                       COUNT(DISTINCT l.Loan_ID) AS total_loans,
+                                       SUM(t.amount) AS total_transaction_volume
+                                FROM branches b
+                                LEFT JOIN customers c ON c.city = b.City
+                                LEFT JOIN loans l ON l.Branch = b.Branch_Name
+                                LEFT JOIN transactions t ON t.customer_id = c.customer_id
+                                GROUP BY b.Branch_Name""",
+}
+MV_MAX_AGE = "-1 day"
+# A stale rollup that failed to rebuild (missing base table, locked
+# database) is retried at most this often, not on every rerun.
+MV_RETRY_SECONDS = 300
+
+# IMMEDIATE takes the write lock up front, so a write transaction never
+# fails midway trying to upgrade from a read lock. The writer connection
+# is shared by every session thread, so WRITE_LOCK keeps one session's
+# statements from landing inside another session's transaction.
+WRITE_LOCK = threading.Lock()
+
+@contextmanager
+def transaction(conn):
+    with WRITE_LOCK:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+# Runs inside the caller's transaction, so customer writes can rebuild the
+# rollups atomically. Each rollup is rebuilt under its own savepoint: if
+# its base tables don't exist yet (e.g. before the notebook has loaded
+# the data), the DROP is rolled back and the previous copy stays in place.
+# Returns the names actually rebuilt.
+def rebuild_materialized_views(conn, names=MATERIALIZED_VIEWS):
+    conn.execute("CREATE TABLE IF NOT EXISTS mv_refresh_log (name TEXT PRIMARY KEY, last_refresh TEXT)")
+    rebuilt = []
+    for name in names:
+        conn.execute("SAVEPOINT mv_rebuild")
+        try:
+            conn.execute(f"DROP TABLE IF EXISTS {name}")
+            conn.execute(f"CREATE TABLE {name} AS {MATERIALIZED_VIEWS[name]}")
+        except sqlite3.OperationalError:
+            conn.execute("ROLLBACK TO mv_rebuild")
+            conn.execute("RELEASE mv_rebuild")
+            continue
+        conn.execute("RELEASE mv_rebuild")
+        conn.execute("INSERT OR REPLACE INTO mv_refresh_log VALUES (?, datetime('now'))", (name,))
+        rebuilt.append(name)
+    return rebuilt
+
+def refresh_materialized_views(conn, names=MATERIALIZED_VIEWS):
+    with transaction(conn):
+        return rebuild_materialized_views(conn, names)
+
+# Last rebuild attempt per rollup, shared by all sessions of this server.
+@st.cache_resource
+def get_mv_attempts():
+    return {}
+
+def ensure_materialized_views(conn):
+    try:
+        fresh = {r[0] for r in conn.execute(
+            "SELECT name FROM mv_refresh_log WHERE last_refresh >= datetime('now', ?)", (MV_MAX_AGE,))}
+    except sqlite3.OperationalError:
+        fresh = set()
+    attempts = get_mv_attempts()
+    now = time.monotonic()
+    stale = [name for name in MATERIALIZED_VIEWS
+             if name not in fresh and now - attempts.get(name, -MV_RETRY_SECONDS) >= MV_RETRY_SECONDS]
+    if not stale:
+        return []
+    attempts.update(dict.fromkeys(stale, now))
+    return refresh_materialized_views(conn, stale)
 
 @st.cache_resource
 def get_connection():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+    # isolation_level=None disables implicit transactions; writes go
+    # through transaction().
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+    for p in PRAGMAS:
+        conn.execute(f"PRAGMA {p}")
+    conn.execute("PRAGMA optimize")
+    return conn
+
+# All dashboard reads go through a separate read-only connection, so
+# under WAL they never queue behind a CRUD write on `conn`. Opened after
+# get_connection() has switched the database to WAL.
+@st.cache_resource
+def get_ro_connection():
+    ro_conn = sqlite3.connect(READ_ONLY_URI, uri=True, check_same_thread=False)
+    for p in READER_PRAGMAS:
+        ro_conn.execute(f"PRAGMA {p}")
+    return ro_conn
 
 conn = get_connection()
+ro_conn = get_ro_connection()
+
+# Checked on every run rather than in get_connection(), so a long-running
+# server picks up tables the notebook has reloaded and still rebuilds
+# rollups once they pass MV_MAX_AGE.
+try:
+    schema_changed = ensure_generated_columns(conn)
+    schema_changed = ensure_indexes(conn) or schema_changed
+    if ensure_materialized_views(conn) or schema_changed:
+        st.cache_data.clear()
+except sqlite3.Error as e:
+    st.warning(f"Database setup could not be completed: {e}")
 
 # ------------------------------
 # Helper: Run SQL Query
 # ------------------------------
-def run_query(query, params=None):
+# Results are memoized per (query, params) so Streamlit reruns don't hit
+# SQLite again. `ro_conn` is read as a global because it can't be hashed.
+# Write paths must call st.cache_data.clear() to drop stale results.
+#
+# Rows are fetched through a sqlite3 cursor and wrapped in a DataFrame
+# without pd.read_sql_query's extra type coercion. sqlite3's per-connection
+# statement cache (128 entries by default, more than the app's distinct
+# statements) keys prepared statements by SQL text, so a repeated query
+# skips parsing and planning.
+#
+# Results stay on plain sqlite3 reads rather than an Arrow reader:
+# ADBC's SQLite driver fixes each column's type from the first batch
+# and fails the whole query on a later row with another storage class
+# (e.g. a REAL in an INTEGER column written by the CSV import).
+@st.cache_data(ttl=600, show_spinner=False)
+def cached_query(query: str, params: tuple | None = None):
+    cur = ro_conn.execute(query, params or ())
+    return pd.DataFrame(cur.fetchall(), columns=[d[0] for d in cur.description])
+
+# Raw rows for callers that don't need a DataFrame (e.g. Plotly, which
+# takes plain sequences), skipping pandas' per-column dtype inference.
+@st.cache_data(ttl=600, show_spinner=False)
+def cached_rows(query: str, params: tuple | None = None):
+    return ro_conn.execute(query, params or ()).fetchall()
+
+# Numeric-only results as one ndarray per column, keyed by column name.
+# `dtypes` maps each selected column, in order, to a NumPy dtype string.
+@st.cache_data(ttl=600, show_spinner=False)
+def cached_arrays(query: str, dtypes: dict, params: tuple | None = None):
+    rows = ro_conn.execute(query, params or ()).fetchall()
+    return {col: np.fromiter((r[i] for r in rows), dtype=dt, count=len(rows))
+            for i, (col, dt) in enumerate(dtypes.items())}
+
+# Yields the result in DataFrames of up to `chunksize` rows, so callers
+# that only show the first page never hold the full result in memory.
+# Not cached: the chunks are produced lazily.
+def iter_query(query: str, params: tuple | None = None, chunksize: int = 50_000):
     try:
-        if params:
-            df = pd.read_sql_query(query, conn, params=params)
-        else:
-            df = pd.read_sql_query(query, conn)
-        return df
+        cur = ro_conn.execute(query, params or ())
+        columns = [d[0] for d in cur.description]
+        while rows := cur.fetchmany(chunksize):
+            yield pd.DataFrame(rows, columns=columns)
+    except Exception as e:
+        st.error(f"SQL Error: {e}")
+
+# Row count of `query` for paginated displays, or None after showing the
+# error. Cached like the rows themselves, so paging doesn't recount.
+def count_rows(query: str):
+    try:
+        return cached_rows(f"SELECT COUNT(*) FROM ({query})")[0][0]
+    except Exception as e:
+        st.error(f"SQL Error: {e}")
+        return None
+
+def run_query(query: str, params: tuple | None = None, chunksize: int | None = None):
+    if chunksize:
+        return iter_query(query, tuple(params) if params else None, chunksize)
+    try:
+        return cached_query(query, tuple(params) if params else None)
     except Exception as e:
         st.error(f"SQL Error: {e}")
         return pd.DataFrame()
 
+# ------------------------------
+# Insight Queries
+# ------------------------------
+# Queries 1-3 and 16-18 read customers and accounts directly. Their
+# joins and GROUP BYs are index-backed, and a shared per-customer
+# rollup would have to be rebuilt on every CRUD write. The per-customer
+# counts (6, 8, 10, 26) also stay in SQL: they run as covering-index
+# scans and cached_query memoizes their small results.
+QUERIES = {
+    "1. How many customers exist per city, and what is their average account balance?":
+            """SELECT city, COUNT(*) AS customers, 
+           AVG(account_balance) AS avg_balance
+           FROM customers c
+           JOIN accounts a USING (customer_id)
+           GROUP BY city LIMIT 5;""" ,
+
+    "2. Which account type holds the highest total balance?": 
+            """SELECT 
+           c.account_type,
+           SUM(a.account_balance) AS total_balance
+           FROM customers c
+           JOIN accounts a 
+           ON c.customer_id = a.customer_id
+           GROUP BY c.account_type
+           ORDER BY total_balance DESC;""",
+
+    "3. Top 10 customers by total balance across all accounts":
+             """SELECT 
+           c.customer_id,
+           c.name,
+           c.city,
+           c.account_type,
+           SUM(a.account_balance) AS total_balance
+           FROM customers c
+           JOIN accounts a 
+           ON c.customer_id = a.customer_id
+           GROUP BY c.customer_id, c.name, c.city, c.account_type
+           ORDER BY total_balance DESC
+           LIMIT 5;""",
+
+    "4. Customers who opened accounts in 2023 with balance > ₹1,00,000":
+            """SELECT 
+           c.customer_id,
+           c.name,
+           c.city,
+           c.account_type,
+           a.account_balance,
+           c.join_date
+           FROM customers c
+           JOIN accounts a 
+           ON c.customer_id = a.customer_id
+           WHERE c.join_date >= '2023-01-01' AND c.join_date < '2024-01-01'
+           AND a.account_balance > 100000
+           ORDER BY a.account_balance DESC LIMIT 5;""",
+
+    "5. Total transaction volume by transaction type":
+            """SELECT txn_type, SUM(amount) AS total_transaction_volume
+           FROM transactions
+           GROUP BY txn_type
+           ORDER BY total_transaction_volume DESC;""",
+
+    "6. Accounts with more than 3 failed transactions in a month":
+            """SELECT customer_id,
+            strftime('%Y-%m', txn_time) AS txn_month,
+            COUNT(*) AS failed_txn_count
+           FROM transactions
+           WHERE status_code = 0
+           GROUP BY customer_id, txn_month
+           HAVING COUNT(*) > 2
+           ORDER BY failed_txn_count DESC LIMIT 5;""",
+    
+    "7. Top 5 branches by transaction volume (last 6 months)":
+            """SELECT Branch_Name,
+            SUM(total) AS total_transaction_volume
+           FROM mv_branch_daily_txn
+           WHERE txn_date >= date('now', '-6 months')
+           GROUP BY Branch_Name
+           ORDER BY total_transaction_volume DESC LIMIT 5;""",
+
+    "8. Accounts with 5+ high-value transactions (₹95,000+)":
+        """SELECT customer_id, COUNT(txn_id) AS high_value_transaction_count
+           FROM transactions
+           WHERE amount >= 95000 AND status_code = 1
+           GROUP BY customer_id
+           HAVING COUNT(txn_id) >= 5
+           ORDER BY high_value_transaction_count DESC LIMIT 5;""",
+
+    "9. Avg loan amount & interest rate by loan type":
+        """SELECT Loan_Type,
+                  AVG(Loan_Amount) AS avg_loan_amount,
+                  AVG(Interest_Rate) AS avg_interest_rate
+           FROM loans
+           GROUP BY Loan_Type
+           ORDER BY avg_loan_amount DESC;""",
+
+    "10. Customers holding more than one active loan":
+        """SELECT Customer_ID,
+                  COUNT(*) AS active_loans
+           FROM loans
+           WHERE Loan_Status IN ('Active', 'Approved')
+           GROUP BY Customer_ID
+           HAVING COUNT(*) > 1
+           ORDER BY active_loans DESC LIMIT 5;""",
+
+    "11. Top 5 customers with highest outstanding loan amount":
+        """SELECT Customer_ID,
+                  SUM(Loan_Amount) AS total_outstanding
+           FROM loans
+           WHERE Loan_Status != 'Closed'
+           GROUP BY Customer_ID
+           ORDER BY total_outstanding DESC LIMIT 5;""",
+
+    "12. Branch with highest account balance":
+        """SELECT Branch_Name, total_balance
+           FROM mv_branch_balances
+           ORDER BY total_balance DESC LIMIT 5;""",
+
+    "13. Branch performance (customers, loans, transactions)":
+        """SELECT Branch_Name, total_customers, total_loans, total_transaction_volume
+           FROM mv_branch_performance;""",
+
+    "14. Issue categories with longest resolution time":
+        """SELECT issue_category,
+                  AVG(JULIANDAY(date_closed) - JULIANDAY(date_opened)) AS avg_resolution_days
+           FROM support_tickets
+           WHERE date_opened IS NOT NULL
+           GROUP BY issue_category
+           ORDER BY avg_resolution_days DESC;""",
+
+    "15. Agents resolving most critical tickets with rating ≥ 4":
+        """SELECT Support_Agent,
+                  COUNT(*) AS resolved_critical_high_rating
+           FROM support_tickets
+           WHERE priority = 'Critical'
+             AND Customer_Rating >= 4
+             AND status = 'Resolved'
+           GROUP BY Support_Agent
+           ORDER BY resolved_critical_high_rating DESC;""",
+    "16. How many customers exist in each city?":
+        """SELECT city, COUNT(*) AS total_customers
+        FROM customers
+        GROUP BY city;
+        """,
+    "17. What is the average account balance by account type?":
+        """SELECT account_type, AVG(account_balance) AS avg_balance
+        FROM customers c
+        JOIN accounts a ON c.customer_id = a.customer_id
+        GROUP BY account_type;""",
+
+    "18. Who are the top 10 customers by total account balance?":
+        """SELECT c.name, SUM(a.account_balance) AS total_balance
+        FROM customers c
+        JOIN accounts a ON c.customer_id = a.customer_id
+        GROUP BY c.customer_id
+        ORDER BY total_balance DESC
+        LIMIT 10;""",
+
+    "19. Which customers opened accounts in 2023 with balance > ₹1,00,000?":
+        """SELECT c.customer_id, c.name, a.account_balance
+        FROM customers c
+        JOIN accounts a ON c.customer_id = a.customer_id
+        WHERE c.join_date >= '2023-01-01' AND c.join_date < '2024-01-01'
+        AND a.account_balance > 100000;""",
+
+    "20. Total transaction volume by transaction type":
+        """SELECT txn_type, SUM(amount) AS total_volume
+        FROM transactions
+        GROUP BY txn_type;""",
+
+    "21.Support agents who resolved most critical tickets with rating ≥ 4":
+        """SELECT 
+        support_agent,
+        COUNT(*) AS resolved_tickets
+        FROM tickets
+        WHERE priority = 'Critical'
+        AND customer_rating >= 4
+        AND status = 'Resolved'
+        GROUP BY support_agent
+        ORDER BY resolved_tickets DESC;
+        """,
+
+    "22. Retrieve all customers who have not updated their account balance in the last 30 days.":
+         """SELECT *
+        FROM accounts
+        WHERE last_updated < DATE('now', '-30 days');
+        """,
+
+    "23. Find the average age of customers for each account type.":
+        """SELECT account_type, AVG(age) AS avg_age
+        FROM customers
+        GROUP BY account_type;
+        """,
+
+    "24. Count how many transactions happened on weekends.":
+        """SELECT COUNT(*) AS weekend_transactions
+        FROM transactions
+        WHERE txn_dow IN (0, 6);
+        """,
+
+    "25. Find customers who made at least one transaction above ₹50,000.":
+        """SELECT DISTINCT customer_id
+        FROM transactions
+        WHERE amount > 50000;
+        """,
+
+    "26. Get the total number of failed transactions per customer.":
+        """SELECT customer_id, COUNT(*) AS failed_count
+        FROM transactions
+        WHERE status_code = 0
+        GROUP BY customer_id;
+        """,
+
+    "7. Find the 10 earliest registered customers.":
+        """SELECT *
+        FROM customers
+        ORDER BY join_date
+        LIMIT 10;
+        """,
+
+    "28. Retrieve customers who live in the same city as more than 2 other customers.":
+        """SELECT city, COUNT(*) AS num_customers
+        FROM customers
+        GROUP BY city
+        HAVING num_customers > 2;
+        """,
+
+    "29. Find the count of transactions by status (success/failed).":
+        """SELECT status, COUNT(*) AS count
+        FROM transactions
+        GROUP BY status;
+        """,
+
+    "30. Show customers whose name starts with 'A'.":
+        """SELECT *
+        FROM customers
+        WHERE name >= 'A' COLLATE NOCASE AND name < 'B' COLLATE NOCASE;
+        """
+}
+
+# Whitelisted, paginated preview statements for View Tables. The SQL text
+# is fixed per table so sqlite3 can reuse the prepared statement across
+# pages.
+PAGE_SIZE = 1000
+TABLE_PREVIEW_SQL = {
+    "customers": "SELECT * FROM customers LIMIT ? OFFSET ?",
+    "accounts": "SELECT * FROM accounts LIMIT ? OFFSET ?",
+    "transactions": "SELECT txn_id, customer_id, txn_type, amount, txn_time, status FROM transactions LIMIT ? OFFSET ?",
+    "loans": "SELECT * FROM loans LIMIT ? OFFSET ?",
+    "credit_cards": "SELECT * FROM credit_cards LIMIT ? OFFSET ?",
+    "branches": "SELECT * FROM branches LIMIT ? OFFSET ?",
+    "support_tickets": "SELECT * FROM support_tickets LIMIT ? OFFSET ?",
+}
+
+# Insight queries with no LIMIT. Only their first PAGE_SIZE rows are
+# read, alongside a COUNT(*) for the total.
+STREAMED_QUERIES = {
+    "22. Retrieve all customers who have not updated their account balance in the last 30 days.",
+}
+
+CRUD_ACTIONS = ["Create", "Read", "Update", "Delete"]
+
+CHART_TYPES = [
+    "Customers by City",
+    "Transaction Volume by Type",
+    "Account Balance Distribution"
+]
+
+# Pages with their own widgets run as fragments, so picking a table,
+# query or chart reruns only that page instead of the whole script.
+
+# ------------------------------
+# VIEW TABLES
+# ------------------------------
+@st.fragment
+def view_tables_page():
+    st.title("📁 View Database Tables")
+
+    choice = st.selectbox("Select Table", list(TABLE_PREVIEW_SQL))
+    total = count_rows(f"SELECT * FROM {choice}")
+    if total is None:
+        return
+    pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+    page = st.number_input("Page", min_value=1, max_value=pages, step=1)
+    st.caption(f"Page {page} of {pages} ({total} rows)")
+
+    df = run_query(TABLE_PREVIEW_SQL[choice], (PAGE_SIZE, (page - 1) * PAGE_SIZE))
+    st.dataframe(df, use_container_width=True)
+
+# ------------------------------
+# SQLITE QUERIES
+# ------------------------------
+@st.fragment
+def queries_page():
+    st.title("📊 Run SQLite Insights Queries")
+
+    selected = st.selectbox("Choose a query", list(QUERIES.keys()))
+
+    if st.button("Run Query"):
+        sql = QUERIES[selected]
+        if selected in STREAMED_QUERIES:
+            total = count_rows(sql.rstrip().rstrip(";"))
+            if total is None:
+                return
+            df = next(run_query(sql, chunksize=PAGE_SIZE), pd.DataFrame())
+            st.caption(f"Showing {len(df)} of {total} rows")
+        else:
+            df = run_query(sql)
+        st.dataframe(df, use_container_width=True)
+
+# ------------------------------
+# CHARTS
+# ------------------------------
+# Every chart aggregates in SQL and hands the rows straight to Plotly;
+# there is no client-side group-by. Keep new variants that way rather
+# than post-processing a DataFrame.
+@st.fragment
+def charts_page():
+    st.title("📈 Data Visualizations")
+
+    chart_type = st.selectbox("Select Chart", CHART_TYPES)
+
+    try:
+        if chart_type == "Customers by City":
+            rows = cached_rows("SELECT city, COUNT(*) AS total FROM customers GROUP BY city")
+            fig = px.bar(x=[r[0] for r in rows], y=[r[1] for r in rows],
+                         labels={"x": "city", "y": "total"}, title="Customers by City")
+            st.plotly_chart(fig, use_container_width=True)
+
+        elif chart_type == "Transaction Volume by Type":
+            rows = cached_rows("SELECT txn_type, SUM(amount) AS total FROM transactions GROUP BY txn_type")
+            fig = px.pie(names=[r[0] for r in rows], values=[r[1] for r in rows],
+                         title="Transaction Volume by Type")
+            st.plotly_chart(fig, use_container_width=True)
+
+        elif chart_type == "Account Balance Distribution":
+            # Bin in SQL so only one row per ₹10,000 bucket leaves SQLite.
+            # CAST truncates toward zero, so negative balances that aren't
+            # a multiple of 10,000 are moved down one bucket (floor).
+            cols = cached_arrays("""SELECT (b - (account_balance < b * 10000)) * 10000 AS bucket,
+                                           COUNT(*) AS count
+                                    FROM (SELECT account_balance,
+                                                 CAST(account_balance / 10000 AS INTEGER) AS b
+                                          FROM accounts
+                                          WHERE account_balance IS NOT NULL)
+                                    GROUP BY bucket
+                                    ORDER BY bucket""", {"bucket": "int64", "count": "int64"})
+            fig = px.bar(x=cols["bucket"], y=cols["count"],
+                         labels={"x": "account_balance", "y": "count"}, title="Account Balance Distribution")
+            st.plotly_chart(fig, use_container_width=True)
+    except Exception as e:
+        st.error(f"SQL Error: {e}")
+
 # ------------------------------
 # Sidebar Navigation
 # ------------------------------
@@ -59,273 +670,11 @@ if menu == "🏠 Home":
         - Visualize charts
     """)
 
-# ------------------------------
-# VIEW TABLES
-# ------------------------------
 elif menu == "📁 View Tables":
-    st.title("📁 View Database Tables")
-
-    tables = ["customers", "accounts", "transactions", "loans", "credit_cards", "branches", "support_tickets"]
-    choice = st.selectbox("Select Table", tables)
-
-    df = run_query(f"SELECT * FROM {choice}")
-    st.dataframe(df, use_container_width=True)
+    view_tables_page()
 
-# ------------------------------
-# SQLITE QUERIES
-# ------------------------------
 elif menu == "📊 SQLite Queries":
-    st.title("📊 Run SQLite Insights Queries")
-
-    queries = {
-        "1. How many customers exist per city, and what is their average account balance?":
-                """SELECT city, COUNT(*) AS customers, 
-               AVG(account_balance) AS avg_balance
-               FROM customers c
-               JOIN accounts a USING (customer_id)
-               GROUP BY city LIMIT 5;""" ,
-
-        "2. Which account type holds the highest total balance?": 
-                """SELECT 
-               c.account_type,
-               SUM(a.account_balance) AS total_balance
-               FROM customers c
-               JOIN accounts a 
-               ON c.customer_id = a.customer_id
-               GROUP BY c.account_type
-               ORDER BY total_balance DESC;""",
-
-        "3. Top 10 customers by total balance across all accounts":
-                 """SELECT 
-               c.customer_id,
-               c.name,
-               c.city,
-               c.account_type,
-               SUM(a.account_balance) AS total_balance
-               FROM customers c
-               JOIN accounts a 
-               ON c.customer_id = a.customer_id
-               GROUP BY c.customer_id, c.name, c.city, c.account_type
-               ORDER BY total_balance DESC
-               LIMIT 5;""",
-
-        "4. Customers who opened accounts in 2023 with balance > ₹1,00,000":
-                """SELECT 
-               c.customer_id,
-               c.name,
-               c.city,
-               c.account_type,
-               a.account_balance,
-               c.join_date
-               FROM customers c
-               JOIN accounts a 
-               ON c.customer_id = a.customer_id
-               WHERE strftime('%Y', c.join_date) = '2023'
-               AND a.account_balance > 100000
-               ORDER BY a.account_balance DESC LIMIT 5;""",
-
-        "5. Total transaction volume by transaction type":
-                """SELECT txn_type, SUM(amount) AS total_transaction_volume
-               FROM transactions
-               GROUP BY txn_type
-               ORDER BY total_transaction_volume DESC;""",
-
-        "6. Accounts with more than 3 failed transactions in a month":
-                """SELECT customer_id,
-                strftime('%Y-%m', txn_time) AS txn_month,
-                COUNT(*) AS failed_txn_count
-               FROM transactions
-               WHERE status = 'failed'
-               GROUP BY customer_id, txn_month
-               HAVING COUNT(*) > 2
-               ORDER BY failed_txn_count DESC LIMIT 5;""",
-        
-        "7. Top 5 branches by transaction volume (last 6 months)":
-                """SELECT b.Branch_Name,
-                SUM(t.amount) AS total_transaction_volume
-               FROM transactions t
-               JOIN customers c ON t.customer_id = c.customer_id
-               JOIN branches b ON c.city = b.City
-               WHERE t.txn_time >= strftime('%Y-%m-%d', 'now', '-6 months')
-               GROUP BY b.Branch_Name
-               ORDER BY total_transaction_volume DESC LIMIT 5;""",
-
-        "8. Accounts with 5+ high-value transactions (₹95,000+)":
-            """SELECT customer_id, COUNT(txn_id) AS high_value_transaction_count
-               FROM transactions
-               WHERE amount >= 95000 AND status = 'success'
-               GROUP BY customer_id
-               HAVING COUNT(txn_id) >= 5
-               ORDER BY high_value_transaction_count DESC LIMIT 5;""",
-
-        "9. Avg loan amount & interest rate by loan type":
-            """SELECT Loan_Type,
-                      AVG(Loan_Amount) AS avg_loan_amount,
-                      AVG(Interest_Rate) AS avg_interest_rate
-               FROM loans
-               GROUP BY Loan_Type
-               ORDER BY avg_loan_amount DESC;""",
-
-        "10. Customers holding more than one active loan":
-            """SELECT Customer_ID,
-                      COUNT(*) AS active_loans
-               FROM loans
-               WHERE Loan_Status IN ('Active', 'Approved')
-               GROUP BY Customer_ID
-               HAVING COUNT(*) > 1
-               ORDER BY active_loans DESC LIMIT 5;""",
-
-        "11. Top 5 customers with highest outstanding loan amount":
-            """SELECT Customer_ID,
-                      SUM(Loan_Amount) AS total_outstanding
-               FROM loans
-               WHERE Loan_Status != 'Closed'
-               GROUP BY Customer_ID
-               ORDER BY total_outstanding DESC LIMIT 5;""",
-
-        "12. Branch with highest account balance":
-            """SELECT b.Branch_Name,
-                      SUM(a.account_balance) AS total_balance
-               FROM accounts a
-               JOIN customers c ON a.customer_id = c.customer_id
-               JOIN branches b ON c.city = b.City
-               GROUP BY b.Branch_Name
-               ORDER BY total_balance DESC LIMIT 5;""",
-
-        "13. Branch performance (customers, loans, transactions)":
-            """SELECT b.Branch_Name,
-                      COUNT(DISTINCT c.customer_id) AS total_customers,
-                      COUNT(DISTINCT l.Loan_ID) AS total_loans,
-                      SUM(t.amount) AS total_transaction_volume
-               FROM branches b
-               LEFT JOIN customers c ON c.city = b.City
-               LEFT JOIN loans l ON l.Branch = b.Branch_Name
-               LEFT JOIN transactions t ON t.customer_id = c.customer_id
-               GROUP BY b.Branch_Name;""",
-
-        "14. Issue categories with longest resolution time":
-            """SELECT issue_category,
-                      AVG(JULIANDAY(date_closed) - JULIANDAY(date_opened)) AS avg_resolution_days
-               FROM support_tickets
-               WHERE date_opened IS NOT NULL
-               GROUP BY issue_category
-               ORDER BY avg_resolution_days DESC;""",
-
-        "15. Agents resolving most critical tickets with rating ≥ 4":
-            """SELECT Support_Agent,
-                      COUNT(*) AS resolved_critical_high_rating
-               FROM support_tickets
-               WHERE priority = 'Critical'
-                 AND Customer_Rating >= 4
-                 AND status = 'Resolved'
-               GROUP BY Support_Agent
-               ORDER BY resolved_critical_high_rating DESC;""",
-        "16. How many customers exist in each city?":
-            """SELECT city, COUNT(*) AS total_customers
-            FROM customers
-            GROUP BY city;
-            """,
-        "17. What is the average account balance by account type?":
-            """SELECT account_type, AVG(account_balance) AS avg_balance
-            FROM customers c
-            JOIN accounts a ON c.customer_id = a.customer_id
-            GROUP BY account_type;""",
-
-        "18. Who are the top 10 customers by total account balance?":
-            """SELECT c.name, SUM(a.account_balance) AS total_balance
-            FROM customers c
-            JOIN accounts a ON c.customer_id = a.customer_id
-            GROUP BY c.customer_id
-            ORDER BY total_balance DESC
-            LIMIT 10;""",
-
-        "19. Which customers opened accounts in 2023 with balance > ₹1,00,000?":
-            """SELECT c.customer_id, c.name, a.account_balance
-            FROM customers c
-            JOIN accounts a ON c.customer_id = a.customer_id
-            WHERE strftime('%Y', c.join_date) = '2023'
-            AND a.account_balance > 100000;""",
-
-        "20. Total transaction volume by transaction type":
-            """SELECT txn_type, SUM(amount) AS total_volume
-            FROM transactions
-            GROUP BY txn_type;""",
-
-        "21.Support agents who resolved most critical tickets with rating ≥ 4":
-            """SELECT 
-            support_agent,
-            COUNT(*) AS resolved_tickets
-            FROM tickets
-            WHERE priority = 'Critical'
-            AND customer_rating >= 4
-            AND status = 'Resolved'
-            GROUP BY support_agent
-            ORDER BY resolved_tickets DESC;
-            """,
-
-        "22. Retrieve all customers who have not updated their account balance in the last 30 days.":
-             """SELECT *
-            FROM accounts
-            WHERE last_updated < DATE('now', '-30 days');
-            """,
-
-        "23. Find the average age of customers for each account type.":
-            """SELECT account_type, AVG(age) AS avg_age
-            FROM customers
-            GROUP BY account_type;
-            """,
-
-        "24. Count how many transactions happened on weekends.":
-            """SELECT COUNT(*) AS weekend_transactions
-            FROM transactions
-            WHERE strftime('%w', txn_time) IN ('0','6');
-            """,
-
-        "25. Find customers who made at least one transaction above ₹50,000.":
-            """SELECT DISTINCT customer_id
-            FROM transactions
-            WHERE amount > 50000;
-            """,
-
-        "26. Get the total number of failed transactions per customer.":
-            """SELECT customer_id, COUNT(*) AS failed_count
-            FROM transactions
-            WHERE status = 'failed'
-            GROUP BY customer_id;
-            """,
-
-        "7. Find the 10 earliest registered customers.":
-            """SELECT *
-            FROM customers
-            ORDER BY join_date
-            LIMIT 10;
-            """,
-
-        "28. Retrieve customers who live in the same city as more than 2 other customers.":
-            """SELECT city, COUNT(*) AS num_customers
-            FROM customers
-            GROUP BY city
-            HAVING num_customers > 2;
-            """,
-
-        "29. Find the count of transactions by status (success/failed).":
-            """SELECT status, COUNT(*) AS count
-            FROM transactions
-            GROUP BY status;
-            """,
-
-        "30. Show customers whose name starts with 'A'.":
-            """SELECT *
-            FROM customers
-            WHERE name LIKE 'A%';
-            """
-    }
-
-    selected = st.selectbox("Choose a query", list(queries.keys()))
-
-    if st.button("Run Query"):
-        df = run_query(queries[selected])
-        st.dataframe(df, use_container_width=True)
+    queries_page()
 
 # ------------------------------
 # CRUD OPERATIONS
@@ -333,7 +682,21 @@ elif menu == "📊 SQLite Queries":
 elif menu == "🛠 CRUD Operations":
     st.title("🛠 CRUD Operations for Customers")
 
-    action = st.radio("Select Action", ["Create", "Read", "Update", "Delete"])
+    action = st.radio("Select Action", CRUD_ACTIONS)
+
+    try:
+        last_refresh = ro_conn.execute("SELECT MIN(last_refresh) FROM mv_refresh_log").fetchone()[0]
+    except sqlite3.Error:
+        last_refresh = None
+    st.caption(f"Branch rollups last refreshed: {last_refresh} UTC" if last_refresh
+               else "Branch rollups have not been built yet")
+    if st.button("Refresh Branch Rollups"):
+        try:
+            refresh_materialized_views(conn)
+            st.cache_data.clear()
+            st.success("Branch rollups refreshed!")
+        except Exception as e:
+            st.error(e)
 
     # CREATE
     if action == "Create":
@@ -347,17 +710,37 @@ elif menu == "🛠 CRUD Operations":
 
         if st.button("Add Customer"):
             try:
-                conn.execute("INSERT INTO customers VALUES (?,?,?,?,?,?, DATE('now'))", (cid, name, gender, age, city, account_type))
-                conn.commit()
+                with transaction(conn):
+                    conn.execute("INSERT INTO customers VALUES (?,?,?,?,?,?, DATE('now'))", (cid, name, gender, age, city, account_type))
+                    rebuild_materialized_views(conn)
+                st.cache_data.clear()
                 st.success("Customer added successfully!")
             except Exception as e:
                 st.error(e)
 
+        st.subheader("Bulk Add Customers")
+        upload = st.file_uploader("Bulk add customers (CSV)", type="csv")
+        st.caption("Columns: customer_id, name, gender, age, city, account_type")
+
+        if upload is not None and st.button("Import Customers"):
+            try:
+                rows = pd.read_csv(upload).itertuples(index=False, name=None)
+                with transaction(conn):
+                    cur = conn.executemany("INSERT INTO customers VALUES (?,?,?,?,?,?, DATE('now'))", rows)
+                    rebuild_materialized_views(conn)
+                st.cache_data.clear()
+                st.success(f"{cur.rowcount} customers added successfully!")
+            except Exception as e:
+                st.error(e)
+
     # READ
     elif action == "Read":
         st.subheader("All Customers")
-        df = run_query("SELECT * FROM customers")
-        st.dataframe(df)
+        total = count_rows("SELECT * FROM customers")
+        if total is not None:
+            df = next(run_query("SELECT * FROM customers", chunksize=PAGE_SIZE), pd.DataFrame())
+            st.caption(f"Showing {len(df)} of {total} customers")
+            st.dataframe(df)
 
     # UPDATE
     elif action == "Update":
@@ -366,9 +749,14 @@ elif menu == "🛠 CRUD Operations":
         new_city = st.text_input("New City")
 
         if st.button("Update"):
-            conn.execute("UPDATE customers SET city=? WHERE customer_id=?", (new_city, cid))
-            conn.commit()
-            st.success("Customer updated!")
+            try:
+                with transaction(conn):
+                    conn.execute("UPDATE customers SET city=? WHERE customer_id=?", (new_city, cid))
+                    rebuild_materialized_views(conn)
+                st.cache_data.clear()
+                st.success("Customer updated!")
+            except Exception as e:
+                st.error(e)
 
     # DELETE
     elif action == "Delete":
@@ -376,37 +764,17 @@ elif menu == "🛠 CRUD Operations":
         cid = st.text_input("Customer ID to Delete")
 
         if st.button("Delete"):
-            conn.execute("DELETE FROM customers WHERE customer_id=?", (cid,))
-            conn.commit()
-            st.success("Customer deleted!")
+            try:
+                with transaction(conn):
+                    conn.execute("DELETE FROM customers WHERE customer_id=?", (cid,))
+                    rebuild_materialized_views(conn)
+                st.cache_data.clear()
+                st.success("Customer deleted!")
+            except Exception as e:
+                st.error(e)
 
-# ------------------------------
-# CHARTS
-# ------------------------------
 elif menu == "📈 Charts":
-    st.title("📈 Data Visualizations")
-
-    chart_type = st.selectbox("Select Chart", [
-        "Customers by City", 
-        "Transaction Volume by Type", 
-        "Account Balance Distribution"
-    ])
-
-    if chart_type == "Customers by City":
-        df = run_query("SELECT city, COUNT(*) AS total FROM customers GROUP BY city")
-        fig = px.bar(df, x="city", y="total", title="Customers by City")
-        st.plotly_chart(fig, use_container_width=True)
-
-    elif chart_type == "Transaction Volume by Type":
-        df = run_query("SELECT txn_type, SUM(amount) AS total FROM transactions GROUP BY txn_type")
-        fig = px.pie(df, names="txn_type", values="total", title="Transaction Volume by Type")
-        st.plotly_chart(fig, use_container_width=True)
-
-    elif chart_type == "Account Balance Distribution":
-        df = run_query("SELECT account_balance FROM accounts")
-        fig = px.histogram(df, x="account_balance", title="Account Balance Distribution")
-        st.plotly_chart(fig, use_container_width=True)
-
+    charts_page()
 
 # ------------------------------
 # CREATOR INFO